@@ -6,6 +6,7 @@ Licensed under MIT License
 
 from .via_grid_action import ViaGridGeneratorAction
 
-# Register the action plugin
+# Register the action plugin; the dialog and generator modules are
+# imported on first Run
 plugin = ViaGridGeneratorAction()
 plugin.register()
\ No newline at end of file
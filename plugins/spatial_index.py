@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Spatial Index for Via Grid Generator
+Uniform bucket grid used to find board items near a candidate position
+"""
+
+
+class SpatialIndex:
+    """
+    Uniform grid of buckets keyed by cell coordinates
+
+    Items are registered in every cell their bounding box touches, so a
+    query only has to grow the search box by the probe radius. All
+    coordinates are in KiCad internal units.
+    """
+
+    def __init__(self, cell_size):
+        self.cell_size = max(1, int(cell_size))
+        self.cells = {}
+        self.items = []
+        self.spanning = False
+
+    def insert(self, item, min_x, min_y, max_x, max_y):
+        """Register an item covering the given bounding box"""
+        x0, y0 = self.cell_of(min_x, min_y)
+        x1, y1 = self.cell_of(max_x, max_y)
+        if x0 != x1 or y0 != y1:
+            self.spanning = True
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                self.cells.setdefault((cx, cy), []).append(item)
+        self.items.append(item)
+
+    def query(self, x, y, radius):
+        """Return the items whose bounding box may lie within radius of (x, y)"""
+        x0, y0 = self.cell_of(x - radius, y - radius)
+        x1, y1 = self.cell_of(x + radius, y + radius)
+
+        if x0 == x1 and y0 == y1:
+            return list(self.cells.get((x0, y0), ()))
+
+        found = []
+        if not self.spanning:
+            # Every item sits in exactly one cell, nothing to de-duplicate
+            for cx in range(x0, x1 + 1):
+                for cy in range(y0, y1 + 1):
+                    found.extend(self.cells.get((cx, cy), ()))
+            return found
+
+        seen = set()
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                for item in self.cells.get((cx, cy), ()):
+                    if id(item) not in seen:
+                        seen.add(id(item))
+                        found.append(item)
+        return found
+
+    def cell_of(self, x, y):
+        """Map a coordinate to its cell key"""
+        return (int(x // self.cell_size), int(y // self.cell_size))
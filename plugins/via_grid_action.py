@@ -9,8 +9,6 @@ Main plugin class that integrates with KiCad UI
 import pcbnew
 import wx
 import os
-from .via_grid_dialog import ViaGridDialog
-from .via_grid_generator import ViaGridGenerator
 
 
 class ViaGridGeneratorAction(pcbnew.ActionPlugin):
@@ -76,9 +74,20 @@ class ViaGridGeneratorAction(pcbnew.ActionPlugin):
             )
             return
         
+        # Load the UI and generator only when the plugin is actually used,
+        # so registering the plugin at PCB editor startup stays cheap
+        from .via_grid_dialog import ViaGridDialog
+        from .via_grid_generator import ViaGridGenerator
+        
+        # Create generator; the dialog uses it for dry-run previews
+        generator = ViaGridGenerator(board)
+        
+        def plan(params):
+            return generator.generate_grid(jobs=[params], dry_run=True)
+        
         # Create and show dialog
         frame = wx.GetTopLevelWindows()[0]
-        dialog = ViaGridDialog(frame)
+        dialog = ViaGridDialog(frame, planner=plan)
         
         try:
             if dialog.ShowModal() == wx.ID_OK:
@@ -94,20 +103,11 @@ class ViaGridGeneratorAction(pcbnew.ActionPlugin):
                     style=wx.PD_APP_MODAL | wx.PD_AUTO_HIDE | wx.PD_SMOOTH
                 )
                 
-                # Create generator
-                generator = ViaGridGenerator(board, progress)
-                generator.min_clearance = params['min_clearance']
-                generator.via_to_via_clearance = params['via_to_via_spacing']
+                generator.progress = progress
                 
                 try:
-                    # Generate the via grid
-                    result = generator.generate_grid(
-                        spacing_mm=params['spacing'],
-                        via_size_mm=params['via_size'],
-                        via_drill_mm=params['via_drill'],
-                        net_name=params['net_name'],
-                        use_selected_area=params['use_selected_area']
-                    )
+                    # Generate the via grid, reusing a previewed plan if unchanged
+                    result = generator.generate_grid(jobs=[params])
                     
                     if result['success']:
                         # Refresh the board view
@@ -10,12 +10,16 @@ import wx
 import pcbnew
 
 
+# Upper bound on the entries shown in the net chooser
+MAX_NET_MATCHES = 200
+
+
 class ViaGridDialog(wx.Dialog):
     """
     Configuration dialog for via grid parameters
     """
     
-    def __init__(self, parent):
+    def __init__(self, parent, planner=None):
         super(ViaGridDialog, self).__init__(
             parent,
             title="Via Grid Generator",
@@ -23,6 +27,7 @@ class ViaGridDialog(wx.Dialog):
         )
         
         self.board = pcbnew.GetBoard()
+        self.planner = planner
         self._init_ui()
         self.Centre()
     
@@ -114,17 +119,25 @@ class ViaGridDialog(wx.Dialog):
             wx.ALIGN_CENTER_VERTICAL | wx.ALIGN_RIGHT
         )
         
-        # Get net names from board
-        net_names = self._get_net_names()
-        self.net_choice = wx.Choice(grid_panel, choices=net_names)
+        # Start with the zone nets; the full net list is only read once
+        # the user opens the list or starts typing
+        self.zone_nets = self._get_zone_net_names()
+        self.net_names = None
+        self._filtering = False
+        self.net_choice = wx.ComboBox(
+            grid_panel,
+            choices=self.zone_nets,
+            style=wx.CB_DROPDOWN
+        )
         
         # Try to select GND by default
-        try:
-            gnd_index = net_names.index("GND")
-            self.net_choice.SetSelection(gnd_index)
-        except ValueError:
-            if net_names:
-                self.net_choice.SetSelection(0)
+        if self.board.FindNet("GND"):
+            self.net_choice.SetValue("GND")
+        elif self.zone_nets:
+            self.net_choice.SetValue(self.zone_nets[0])
+        
+        self.net_choice.Bind(wx.EVT_TEXT, self._on_net_text)
+        self.net_choice.Bind(wx.EVT_COMBOBOX_DROPDOWN, self._on_net_dropdown)
         
         via_grid.Add(self.net_choice, 1, wx.EXPAND)
         
@@ -154,6 +167,98 @@ class ViaGridDialog(wx.Dialog):
         
         grid_sizer.Add(area_box, 0, wx.ALL | wx.EXPAND, 5)
         
+        # Placement pattern
+        pattern_box = wx.StaticBoxSizer(wx.VERTICAL, grid_panel, "Pattern")
+        pattern_grid = wx.FlexGridSizer(5, 2, 5, 5)
+        pattern_grid.AddGrowableCol(1)
+        
+        pattern_grid.Add(
+            wx.StaticText(grid_panel, label="Placement:"),
+            0,
+            wx.ALIGN_CENTER_VERTICAL | wx.ALIGN_RIGHT
+        )
+        self.pattern_choice = wx.Choice(
+            grid_panel,
+            choices=["Grid", "Fence along selected tracks"]
+        )
+        self.pattern_choice.SetSelection(0)
+        self.pattern_choice.Bind(wx.EVT_CHOICE, self._on_pattern_changed)
+        pattern_grid.Add(self.pattern_choice, 1, wx.EXPAND)
+        
+        pattern_grid.Add(
+            wx.StaticText(grid_panel, label="Fence Offset (mm):"),
+            0,
+            wx.ALIGN_CENTER_VERTICAL | wx.ALIGN_RIGHT
+        )
+        self.fence_offset_ctrl = wx.SpinCtrlDouble(
+            grid_panel,
+            min=0.1,
+            max=10.0,
+            inc=0.05
+        )
+        self.fence_offset_ctrl.SetValue(1.0)
+        self.fence_offset_ctrl.Enable(False)
+        pattern_grid.Add(self.fence_offset_ctrl, 1, wx.EXPAND)
+        
+        # Density targets switch to priority placement; 0 fills every spot
+        pattern_grid.Add(
+            wx.StaticText(grid_panel, label="Target Density (vias/mm²):"),
+            0,
+            wx.ALIGN_CENTER_VERTICAL | wx.ALIGN_RIGHT
+        )
+        self.target_density_ctrl = wx.SpinCtrlDouble(
+            grid_panel,
+            min=0.0,
+            max=10.0,
+            inc=0.05
+        )
+        self.target_density_ctrl.SetValue(0.0)
+        self.target_density_ctrl.SetToolTip(
+            "Place only as many vias as needed per area, 0 = fill every position"
+        )
+        pattern_grid.Add(self.target_density_ctrl, 1, wx.EXPAND)
+        
+        pattern_grid.Add(
+            wx.StaticText(grid_panel, label="Vias per Pad:"),
+            0,
+            wx.ALIGN_CENTER_VERTICAL | wx.ALIGN_RIGHT
+        )
+        self.pad_target_ctrl = wx.SpinCtrl(
+            grid_panel,
+            min=0,
+            max=20
+        )
+        self.pad_target_ctrl.SetValue(0)
+        self.pad_target_ctrl.SetToolTip(
+            "Vias to place near each pad of the selected net, 0 = no pad target"
+        )
+        pattern_grid.Add(self.pad_target_ctrl, 1, wx.EXPAND)
+        
+        pattern_grid.Add(
+            wx.StaticText(grid_panel, label="Pad Radius (mm):"),
+            0,
+            wx.ALIGN_CENTER_VERTICAL | wx.ALIGN_RIGHT
+        )
+        self.pad_radius_ctrl = wx.SpinCtrlDouble(
+            grid_panel,
+            min=0.5,
+            max=20.0,
+            inc=0.5
+        )
+        self.pad_radius_ctrl.SetValue(2.0)
+        self.pad_radius_ctrl.SetToolTip(
+            "How far beyond a pad's clearance its vias may be placed; "
+            "raise it with the via count, only grid positions in this band are used"
+        )
+        pattern_grid.Add(self.pad_radius_ctrl, 1, wx.EXPAND)
+        
+        # Fences need selected tracks to follow
+        if not self._has_track_selection():
+            self.pattern_choice.Enable(False)
+        
+        pattern_box.Add(pattern_grid, 0, wx.ALL | wx.EXPAND, 5)
+        grid_sizer.Add(pattern_box, 0, wx.ALL | wx.EXPAND, 5)
+        
         grid_panel.SetSizer(grid_sizer)
         notebook.AddPage(grid_panel, "Grid Settings")
         
@@ -209,7 +314,28 @@ class ViaGridDialog(wx.Dialog):
         
         main_sizer.Add(notebook, 1, wx.ALL | wx.EXPAND, 5)
         
+        # Dry-run preview
+        if self.planner:
+            preview_box = wx.StaticBoxSizer(wx.VERTICAL, self, "Preview")
+            self.preview_panel = PlanPreviewPanel(preview_box.GetStaticBox())
+            preview_box.Add(self.preview_panel, 1, wx.ALL | wx.EXPAND, 5)
+            self.preview_status = wx.StaticText(
+                preview_box.GetStaticBox(),
+                label="Click Preview to plan vias without changing the board."
+            )
+            preview_box.Add(self.preview_status, 0, wx.ALL | wx.EXPAND, 5)
+            main_sizer.Add(preview_box, 1, wx.ALL | wx.EXPAND, 5)
+        
         # Buttons
+        bottom_sizer = wx.BoxSizer(wx.HORIZONTAL)
+        
+        if self.planner:
+            preview_btn = wx.Button(self, label="Preview")
+            preview_btn.Bind(wx.EVT_BUTTON, self._on_preview)
+            bottom_sizer.Add(preview_btn, 0, wx.ALIGN_CENTER_VERTICAL)
+        
+        bottom_sizer.AddStretchSpacer()
+        
         btn_sizer = wx.StdDialogButtonSizer()
         
         ok_btn = wx.Button(self, wx.ID_OK, "Generate")
@@ -220,23 +346,75 @@ class ViaGridDialog(wx.Dialog):
         btn_sizer.AddButton(cancel_btn)
         
         btn_sizer.Realize()
-        main_sizer.Add(btn_sizer, 0, wx.ALL | wx.ALIGN_RIGHT, 10)
+        bottom_sizer.Add(btn_sizer, 0)
+        main_sizer.Add(bottom_sizer, 0, wx.ALL | wx.EXPAND, 10)
         
         self.SetSizer(main_sizer)
         self.SetMinSize((400, 450))
         self.Fit()
     
+    def _get_zone_net_names(self):
+        """Get the nets of copper zones, the likely stitching nets"""
+        nets = set()
+        for zone in self.board.Zones():
+            if not zone.GetIsRuleArea() and zone.GetNetname():
+                nets.add(zone.GetNetname())
+        return sorted(nets)
+    
     def _get_net_names(self):
-        """Get list of net names from the board"""
-        nets = []
-        board_nets = self.board.GetNetInfo()
+        """Get list of net names from the board, read on first use"""
+        if self.net_names is None:
+            self.net_names = []
+            board_nets = self.board.GetNetInfo()
+            
+            for net_code in range(board_nets.GetNetCount()):
+                net = board_nets.GetNetItem(net_code)
+                if net and net.GetNetname():
+                    self.net_names.append(net.GetNetname())
+        
+        return self.net_names
+    
+    def _match_net_names(self, text):
+        """Net names containing text, zone nets first, capped at MAX_NET_MATCHES"""
+        needle = text.lower()
+        zone_matches = [n for n in self.zone_nets if needle in n.lower()]
+        
+        zone_set = set(self.zone_nets)
+        other_matches = sorted(
+            n for n in self._get_net_names()
+            if needle in n.lower() and n not in zone_set
+        )
         
-        for net_code in range(board_nets.GetNetCount()):
-            net = board_nets.GetNetItem(net_code)
-            if net and net.GetNetname():
-                nets.append(net.GetNetname())
+        return (zone_matches + other_matches)[:MAX_NET_MATCHES]
+    
+    def _update_net_choices(self, show_all=False):
+        """Refill the net chooser with the names matching its text"""
+        if self._filtering:
+            return
         
-        return sorted(nets)
+        self._filtering = True
+        try:
+            text = self.net_choice.GetValue()
+            insertion = self.net_choice.GetInsertionPoint()
+            self.net_choice.Set(self._match_net_names("" if show_all else text))
+            
+            # Refilling the items may clear the typed text on some platforms
+            self.net_choice.ChangeValue(text)
+            self.net_choice.SetInsertionPoint(insertion)
+        finally:
+            self._filtering = False
+    
+    def _on_net_text(self, event):
+        """Filter the net chooser while typing"""
+        self._update_net_choices()
+        event.Skip()
+    
+    def _on_net_dropdown(self, event):
+        """Load the matching nets when the list is opened"""
+        # A complete net name is a selection, not a filter
+        text = self.net_choice.GetValue()
+        self._update_net_choices(show_all=text in self._get_net_names())
+        event.Skip()
     
     def _has_selection(self):
         """Check if user has selected an area"""
@@ -246,6 +424,34 @@ class ViaGridDialog(wx.Dialog):
                 return True
         return False
     
+    def _has_track_selection(self):
+        """Check if user has selected tracks or arcs"""
+        for track in self.board.GetTracks():
+            if track.IsSelected() and track.GetClass() in ('PCB_TRACK', 'PCB_ARC'):
+                return True
+        return False
+    
+    def _on_pattern_changed(self, event):
+        """Enable the fence offset only for the fence pattern"""
+        is_fence = self.pattern_choice.GetSelection() == 1
+        self.fence_offset_ctrl.Enable(is_fence)
+        self.area_board_radio.Enable(not is_fence)
+        self.area_selection_radio.Enable(not is_fence and self._has_selection())
+    
+    def _on_preview(self, event):
+        """Plan vias for the current parameters and show them"""
+        with wx.BusyCursor():
+            plan = self.planner(self.get_parameters())
+        
+        self.preview_panel.set_plan(plan)
+        if plan['success']:
+            self.preview_status.SetLabel(
+                f"{plan['vias_placed']} vias planned, "
+                f"{plan['vias_skipped']} positions rejected."
+            )
+        else:
+            self.preview_status.SetLabel(f"Planning failed: {plan['error']}")
+    
     def get_parameters(self):
         """Get the configured parameters"""
         spacing = self.spacing_ctrl.GetValue()
@@ -254,12 +460,96 @@ class ViaGridDialog(wx.Dialog):
         if self.spacing_unit.GetSelection() == 1:  # mils
             spacing = spacing * 0.0254
         
+        target_density = self.target_density_ctrl.GetValue()
+        pad_target = self.pad_target_ctrl.GetValue()
+        
         return {
             'spacing': spacing,
             'via_size': self.via_size_ctrl.GetValue(),
             'via_drill': self.drill_size_ctrl.GetValue(),
-            'net_name': self.net_choice.GetStringSelection(),
+            'net_name': self.net_choice.GetValue().strip(),
             'use_selected_area': self.area_selection_radio.GetValue(),
+            'mode': 'fence' if self.pattern_choice.GetSelection() == 1 else 'grid',
+            'fence_offset': self.fence_offset_ctrl.GetValue(),
+            'placement': 'priority' if target_density or pad_target else 'raster',
+            'target_density': target_density,
+            'pad_target': pad_target,
+            'pad_radius': self.pad_radius_ctrl.GetValue(),
             'min_clearance': self.clearance_ctrl.GetValue(),
             'via_to_via_spacing': self.via_spacing_ctrl.GetValue()
-        }
\ No newline at end of file
+        }
+
+
+class PlanPreviewPanel(wx.Panel):
+    """
+    Lightweight overview of a dry-run plan: planned vias and rejection heatmap
+    """
+    
+    def __init__(self, parent):
+        super(PlanPreviewPanel, self).__init__(parent, size=(360, 220))
+        self.plan = None
+        self.SetBackgroundStyle(wx.BG_STYLE_PAINT)
+        self.Bind(wx.EVT_PAINT, self._on_paint)
+        self.Bind(wx.EVT_SIZE, self._on_size)
+    
+    def set_plan(self, plan):
+        """Show a new plan"""
+        self.plan = plan
+        self.Refresh()
+    
+    def _on_size(self, event):
+        """Redraw at the new scale"""
+        self.Refresh()
+        event.Skip()
+    
+    def _on_paint(self, event):
+        """Draw the board outline, heatmap and planned vias"""
+        dc = wx.AutoBufferedPaintDC(self)
+        dc.SetBackground(wx.Brush(wx.Colour(30, 30, 30)))
+        dc.Clear()
+        
+        if not self.plan or not self.plan['area']:
+            return
+        
+        area_x, area_y, area_w, area_h = self.plan['area']
+        if area_w <= 0 or area_h <= 0:
+            return
+        
+        # Fit the board bounding box into the panel
+        margin = 5
+        width, height = self.GetClientSize()
+        scale = min((width - 2 * margin) / area_w, (height - 2 * margin) / area_h)
+        if scale <= 0:
+            return
+        
+        def to_panel(x, y):
+            return (
+                int(margin + (x - area_x) * scale),
+                int(margin + (y - area_y) * scale)
+            )
+        
+        gc = wx.GCDC(dc)
+        
+        # Board outline
+        gc.SetPen(wx.Pen(wx.Colour(200, 200, 80)))
+        gc.SetBrush(wx.TRANSPARENT_BRUSH)
+        gc.DrawRectangle(margin, margin, int(area_w * scale), int(area_h * scale))
+        
+        # Rejection heatmap, more opaque where more candidates were rejected
+        rejections = self.plan['rejections']
+        cell = self.plan['heatmap_cell']
+        cell_px = max(1, int(cell * scale + 0.5))
+        peak = max(rejections.values()) if rejections else 0
+        gc.SetPen(wx.TRANSPARENT_PEN)
+        
+        for (cell_x, cell_y), count in rejections.items():
+            alpha = 40 + int(160 * count / peak)
+            gc.SetBrush(wx.Brush(wx.Colour(220, 50, 50, alpha)))
+            x, y = to_panel(cell_x * cell, cell_y * cell)
+            gc.DrawRectangle(x, y, cell_px, cell_px)
+        
+        # Planned vias
+        gc.SetBrush(wx.Brush(wx.Colour(80, 200, 110)))
+        for via in self.plan['vias']:
+            x, y = to_panel(*via['pos'])
+            gc.DrawCircle(x, y, max(1, int(via['size'] * scale / 2)))
@@ -9,9 +9,47 @@ Handles the actual via placement with DRC checking
 import pcbnew
 import wx
 import math
+import heapq
+import hashlib
 import uuid
 import re
 
+from collections import OrderedDict
+
+from .spatial_index import SpatialIndex
+
+
+class PlanCache:
+    """
+    Small LRU cache of via plans keyed by (board fingerprint, parameters)
+    """
+    
+    def __init__(self, max_size=8):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+    
+    def get(self, key):
+        """Return the cached plan for key, or None"""
+        plan = self.entries.get(key)
+        if plan is not None:
+            self.entries.move_to_end(key)
+        return plan
+    
+    def put(self, key, plan):
+        """Store a plan, evicting the least recently used one if full"""
+        self.entries[key] = plan
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+    
+    def clear(self):
+        """Drop all cached plans"""
+        self.entries.clear()
+
+
+# Shared across plugin runs so a previewed plan can be applied instantly
+_plan_cache = PlanCache()
+
 
 class ViaGridGenerator:
     """
@@ -23,89 +61,288 @@ class ViaGridGenerator:
         self.progress = progress_dialog
         self.min_clearance = 0.2
         self.via_to_via_clearance = 0.1
+        self.index_cell_size = 2.0
+        self.arc_tolerance = 0.001
         
-    def generate_grid(self, spacing_mm, via_size_mm, via_drill_mm, 
-                     net_name, use_selected_area=False):
+    def generate_grid(self, spacing_mm=None, via_size_mm=None, via_drill_mm=None,
+                     net_name=None, use_selected_area=False, jobs=None,
+                     dry_run=False):
         """
         Generate the via grid
         
+        Either pass the parameters for a single net, or a list of job dicts
+        with the keys 'spacing', 'via_size', 'via_drill', 'net_name' and
+        optionally 'use_selected_area', 'min_clearance' and
+        'via_to_via_spacing'. All jobs share one board snapshot and one
+        spatial index, so vias placed for one job are seen by later jobs.
+        
+        A job with 'mode': 'fence' places vias along both sides of the
+        selected tracks instead of on a grid, 'fence_offset' mm from the
+        track centerline and 'spacing' mm apart.
+        
+        A job with 'placement': 'priority' places the candidates that best
+        serve 'target_density' and/or 'pad_target' first and stops once the
+        targets are met, instead of accepting every candidate in raster
+        order (see _place_by_priority). 'pad_radius' (mm, default 2.0)
+        sets how far beyond a pad's clearance ring its vias may go.
+        
+        With dry_run the board is left untouched and the plan from
+        plan_grid() is returned instead.
+        
         Returns dict with:
             - success: bool
             - vias_placed: int
             - vias_skipped: int
             - error: str (if any)
+            - jobs: list of per-job results with the same keys
+        """
+        if jobs is None:
+            jobs = [{
+                'spacing': spacing_mm,
+                'via_size': via_size_mm,
+                'via_drill': via_drill_mm,
+                'net_name': net_name,
+                'use_selected_area': use_selected_area
+            }]
+        
+        plan = self.plan_grid(jobs)
+        if dry_run:
+            return plan
+        return self.apply_plan(plan)
+    
+    def plan_grid(self, jobs):
+        """
+        Compute the via positions for the jobs without modifying the board
+        
+        Plans are memoized by board fingerprint and parameters, so asking
+        again for an unchanged board returns the cached plan immediately.
+        
+        Returns the generate_grid() result dict plus:
+            - vias: list of dicts with pos (x, y), size, drill and net_name
+            - rejections: dict mapping heatmap cell (cx, cy) to rejected count
+            - heatmap_cell: heatmap cell size in internal units
+            - area: board bounding box as (x, y, width, height)
+        """
+        try:
+            # Extract the board once for all jobs
+            self._update_progress("Loading board items...", 5)
+            snapshot = self._extract_snapshot()
+            key = (self._fingerprint(snapshot), self._plan_key(jobs))
+            
+            plan = _plan_cache.get(key)
+            if plan is not None:
+                self._update_progress("Using cached plan", 100)
+                return plan
+            
+            # Reject the whole plan before placing anything if a job is unusable
+            errors = [e for e in (self._validate_job(job) for job in jobs) if e]
+            if errors:
+                return self._failed_plan("\n".join(errors))
+            
+            index = self._build_index(snapshot)
+            planned = []
+            rejections = {}
+            
+            results = []
+            for job_idx, job in enumerate(jobs):
+                results.append(self._run_job(
+                    job, index, planned, rejections, job_idx, len(jobs)
+                ))
+            
+            self._update_progress("Completed", 100)
+            
+            errors = [r['error'] for r in results if not r['success']]
+            bbox = self._get_board_area()
+            plan = {
+                'success': not errors,
+                'vias_placed': sum(r['vias_placed'] for r in results),
+                'vias_skipped': sum(r['vias_skipped'] for r in results),
+                'error': "\n".join(errors) if errors else None,
+                'jobs': results,
+                'vias': planned,
+                'rejections': rejections,
+                'heatmap_cell': index.cell_size,
+                'area': (bbox.GetX(), bbox.GetY(), bbox.GetWidth(), bbox.GetHeight())
+            }
+            
+            if plan['success']:
+                _plan_cache.put(key, plan)
+            return plan
+            
+        except Exception as e:
+            return self._failed_plan(str(e))
+    
+    def _failed_plan(self, error):
+        """Build a plan dict that places nothing"""
+        plan = self._failure(error)
+        plan.update({'vias': [], 'rejections': {}, 'heatmap_cell': 1, 'area': None})
+        return plan
+    
+    def _validate_job(self, job):
+        """Return why a job cannot be planned, or None"""
+        net_name = job['net_name']
+        if not self._find_net(net_name):
+            return f"Net '{net_name}' not found"
+        
+        if job.get('mode', 'grid') == 'fence':
+            if not any(self._fence_primitive(t) for t in self.board.GetTracks()
+                       if t.IsSelected()):
+                return f"No tracks selected for the {net_name} via fence"
+        elif job.get('use_selected_area', False) and not self._get_selected_area():
+            return f"No valid area selected for {net_name}"
+        
+        if job.get('placement', 'raster') == 'priority':
+            if not job.get('target_density') and not job.get('pad_target'):
+                return f"Priority placement for {net_name} needs a density or pad target"
+        
+        return None
+    
+    def apply_plan(self, plan):
         """
+        Add the vias of a plan to the board
+        
+        A failed plan is never applied, not even the vias of its jobs that
+        did succeed, so the board is either fully updated or left alone.
+        """
+        result = {
+            'success': plan['success'],
+            'vias_placed': 0,
+            'vias_skipped': plan['vias_skipped'],
+            'error': plan['error'],
+            'jobs': plan.get('jobs', [])
+        }
+        
+        if not plan['success']:
+            return result
+        
+        try:
+            nets = {}
+            total = len(plan['vias'])
+            
+            for idx, planned in enumerate(plan['vias']):
+                if idx % 100 == 0:
+                    self._update_progress(
+                        f"Adding vias... ({idx} of {total})",
+                        int((idx / total) * 100)
+                    )
+                
+                net_name = planned['net_name']
+                if net_name not in nets:
+                    nets[net_name] = self._find_net(net_name)
+                
+                via = self._create_via(
+                    pcbnew.VECTOR2I(*planned['pos']),
+                    planned['size'],
+                    planned['drill'],
+                    nets[net_name]
+                )
+                self.board.Add(via)
+                result['vias_placed'] += 1
+            
+            self._update_progress("Completed", 100)
+            
+        except Exception as e:
+            result['success'] = False
+            result['error'] = str(e)
+        
+        return result
+    
+    def _run_job(self, job, index, planned, rejections, job_idx, job_count):
+        """Plan the vias of a single net job against the shared index"""
         try:
             # Find the net
+            net_name = job['net_name']
             net = self._find_net(net_name)
             if not net:
-                return {
-                    'success': False,
-                    'error': f"Net '{net_name}' not found",
-                    'vias_placed': 0,
-                    'vias_skipped': 0
-                }
-            
-            # Get placement area
-            if use_selected_area:
-                area = self._get_selected_area()
-                if not area:
-                    return {
-                        'success': False,
-                        'error': "No valid area selected",
-                        'vias_placed': 0,
-                        'vias_skipped': 0
-                    }
-            else:
-                area = self._get_board_area()
+                return self._failure(f"Net '{net_name}' not found")
             
             # Convert to internal units
-            spacing = pcbnew.FromMM(spacing_mm)
-            via_size = pcbnew.FromMM(via_size_mm)
-            via_drill = pcbnew.FromMM(via_drill_mm)
-            
-            # Get existing board items
-            self._update_progress("Loading board items...", 10)
-            existing_vias = self._get_existing_vias()
-            pads = self._get_all_pads()
-            tracks = self._get_all_tracks()
-            zones = self._get_all_zones()
-            
-            # Generate grid positions
-            self._update_progress("Calculating grid positions...", 20)
-            positions = self._generate_grid_positions(area, spacing)
-            total_positions = len(positions)
-            
-            # Place vias
-            placed = 0
-            skipped = 0
-            new_vias = []
-            
-            for idx, pos in enumerate(positions):
-                # Update progress
-                if idx % 10 == 0:
-                    progress = 20 + int((idx / total_positions) * 70)
-                    self._update_progress(
-                        f"Placing vias... ({placed} placed, {skipped} skipped)",
-                        progress
-                    )
-                
-                # Check clearances
-                if self._check_clearances(pos, via_size, net.GetNetCode(),
-                                        existing_vias + new_vias, pads, tracks, zones):
-                    # Create and place via
-                    via = self._create_via(pos, via_size, via_drill, net)
-                    self.board.Add(via)
-                    new_vias.append({
-                        'pos': pos,
-                        'size': via_size,
-                        'net': net.GetNetCode()
-                    })
-                    placed += 1
+            spacing = pcbnew.FromMM(job['spacing'])
+            via_size = pcbnew.FromMM(job['via_size'])
+            via_drill = pcbnew.FromMM(job['via_drill'])
+            min_clear = pcbnew.FromMM(job.get('min_clearance', self.min_clearance))
+            via_clear = pcbnew.FromMM(
+                job.get('via_to_via_spacing', self.via_to_via_clearance)
+            )
+            net_code = net.GetNetCode()
+            
+            # Progress range reserved for this job
+            base = 10 + (90 * job_idx) // job_count
+            span = 90 // job_count
+            
+            if job.get('mode', 'grid') == 'fence':
+                # Candidates along both sides of the selected tracks
+                self._update_progress(
+                    f"Calculating fence positions for {net_name}...", base
+                )
+                fence_offset = pcbnew.FromMM(job['fence_offset'])
+                positions = self._generate_fence_positions(fence_offset, spacing)
+                if not positions:
+                    return self._failure("No tracks selected for the via fence")
+            else:
+                # Get placement area
+                if job.get('use_selected_area', False):
+                    area = self._get_selected_area()
+                    if not area:
+                        return self._failure("No valid area selected")
                 else:
-                    skipped += 1
+                    area = self._get_board_area()
+                
+                # Generate grid positions
+                self._update_progress(
+                    f"Calculating grid positions for {net_name}...", base
+                )
+                positions = self._generate_grid_positions(area, spacing)
             
-            self._update_progress("Completed", 100)
+            def place(pos):
+                """Plan a via at pos if it clears everything nearby"""
+                if not self._check_clearances(pos, via_size, net_code, index,
+                                              min_clear, via_clear):
+                    cell = index.cell_of(pos.x, pos.y)
+                    rejections[cell] = rejections.get(cell, 0) + 1
+                    return False
+                
+                planned.append({
+                    'pos': (pos.x, pos.y),
+                    'size': via_size,
+                    'drill': via_drill,
+                    'net_name': net_name
+                })
+                
+                # Make the new via visible to later positions and jobs
+                self._index_item(index, {
+                    'kind': 'via',
+                    'pos': pos,
+                    'size': via_size,
+                    'net': net_code,
+                    'clearance': min_clear,
+                    'via_clearance': via_clear
+                })
+                return True
+            
+            if job.get('placement', 'raster') == 'priority':
+                placed, skipped = self._place_by_priority(
+                    job, positions, index, net_code, spacing, via_size,
+                    min_clear, place, net_name, base, span
+                )
+            else:
+                total_positions = len(positions)
+                placed = 0
+                skipped = 0
+                
+                for idx, pos in enumerate(positions):
+                    # Update progress
+                    if idx % 10 == 0:
+                        progress = base + int((idx / total_positions) * span)
+                        self._update_progress(
+                            f"Planning {net_name} vias... ({placed} placed, {skipped} skipped)",
+                            progress
+                        )
+                    
+                    if place(pos):
+                        placed += 1
+                    else:
+                        skipped += 1
             
             return {
                 'success': True,
@@ -115,12 +352,246 @@ class ViaGridGenerator:
             }
             
         except Exception as e:
-            return {
-                'success': False,
-                'error': str(e),
-                'vias_placed': 0,
-                'vias_skipped': 0
-            }
+            return self._failure(str(e))
+    
+    def _place_by_priority(self, job, positions, index, net_code, spacing,
+                           via_size, min_clear, place, net_name, base, span):
+        """
+        Place the best scoring candidates first until the targets are met
+        
+        A candidate scores for the via deficit of its density cell
+        ('target_density' vias per mm² of placement area, over
+        'density_cell' mm cells) and for same-net pads that still need vias
+        to reach 'pad_target'. Pads count vias within 'pad_radius' mm of
+        their clearance ring; candidates on the pad copper are never used.
+        The score is scaled by the distance to the nearest same-net via so
+        vias spread out instead of stacking along a cell edge.
+        
+        Scores only drop as vias are placed, so stale heap entries are
+        rescored through the spatial index when popped and requeued if
+        they fell.
+        
+        Returns (placed, skipped).
+        """
+        target_density = job.get('target_density', 0.0)
+        pad_target = job.get('pad_target', 0)
+        density_cell = pcbnew.FromMM(job.get('density_cell', 5.0))
+        pad_radius = pcbnew.FromMM(job.get('pad_radius', 2.0))
+        pad_clear = via_size / 2 + min_clear
+        
+        def cell_key(pos):
+            return (int(pos.x // density_cell), int(pos.y // density_cell))
+        
+        # Per-cell targets from the board area the candidates stand for
+        candidate_area = pcbnew.ToMM(spacing) ** 2
+        candidates_per_cell = {}
+        for pos in positions:
+            key = cell_key(pos)
+            candidates_per_cell[key] = candidates_per_cell.get(key, 0) + 1
+        targets = {
+            key: math.ceil(target_density * count * candidate_area)
+            for key, count in candidates_per_cell.items()
+        }
+        
+        # Same-net vias and pads in their own indexes, so scoring never
+        # walks unrelated copper. Vias are stored as points in density-cell
+        # buckets, which makes a bucket's length the cell's via count.
+        via_index = SpatialIndex(density_cell)
+        pad_index = SpatialIndex(index.cell_size)
+        for item in index.items:
+            if item['net'] != net_code:
+                continue
+            if item['kind'] == 'via':
+                via_index.insert(item['pos'], item['pos'].x, item['pos'].y,
+                                 item['pos'].x, item['pos'].y)
+            elif item['kind'] == 'pad':
+                self._index_item(pad_index, item)
+        
+        # Pad coverage, counted the first time a pad is scored
+        pad_demand = {}
+        
+        def nearby_vias(pos, radius):
+            return via_index.query(pos.x, pos.y, radius)
+        
+        def nearby_pads(pos):
+            if not pad_index.items:
+                return []
+            return pad_index.query(pos.x, pos.y, pad_clear + pad_radius)
+        
+        def pad_ring(pad):
+            # Closest a via center may get to the pad center
+            return pad['size'] / 2 + pad_clear
+        
+        def cell_count(key):
+            return len(via_index.cells.get(key, ()))
+        
+        def demand(pad):
+            if id(pad) not in pad_demand:
+                reach = pad_ring(pad) + pad_radius
+                pad_demand[id(pad)] = pad_target - sum(
+                    1 for via_pos in nearby_vias(pad['pos'], reach)
+                    if self._distance(pad['pos'], via_pos) < reach
+                )
+            return pad_demand[id(pad)]
+        
+        def spread(pos):
+            # 0 on top of a same-net via, 1 at density_cell or further away
+            nearest_sq = density_cell * density_cell
+            for via_pos in nearby_vias(pos, density_cell):
+                dx = via_pos.x - pos.x
+                dy = via_pos.y - pos.y
+                nearest_sq = min(nearest_sq, dx * dx + dy * dy)
+            return math.sqrt(nearest_sq) / density_cell
+        
+        def score(pos):
+            value = 0.0
+            
+            target = targets[cell_key(pos)]
+            if target > 0:
+                value += max(0, target - cell_count(cell_key(pos))) / target
+            
+            for pad in nearby_pads(pos):
+                edge_dist = self._distance(pos, pad['pos']) - pad_ring(pad)
+                if edge_dist < 0:
+                    # Would land on the pad copper
+                    return 0.0
+                if pad_target > 0 and edge_dist < pad_radius:
+                    remaining = demand(pad)
+                    if remaining > 0:
+                        value += (remaining / pad_target) * (1 - edge_dist / pad_radius)
+            
+            if value <= 0:
+                return 0.0
+            return value * spread(pos)
+        
+        # Max-heap on score; ties keep raster order
+        heap = []
+        for idx, pos in enumerate(positions):
+            initial = score(pos)
+            if initial > 0:
+                heap.append((-initial, idx))
+        heapq.heapify(heap)
+        
+        total = len(heap)
+        placed = 0
+        skipped = 0
+        steps = 0
+        
+        while heap:
+            neg_score, idx = heapq.heappop(heap)
+            pos = positions[idx]
+            
+            steps += 1
+            if steps % 50 == 0:
+                progress = base + int((1 - len(heap) / total) * span)
+                self._update_progress(
+                    f"Planning {net_name} vias... ({placed} placed, {skipped} skipped)",
+                    progress
+                )
+            
+            current = score(pos)
+            if current <= 0:
+                # Targets around this candidate are met
+                continue
+            if current < -neg_score - 1e-9:
+                # Stale entry, requeue with its new score
+                heapq.heappush(heap, (-current, idx))
+                continue
+            
+            if not place(pos):
+                skipped += 1
+                continue
+            placed += 1
+            
+            # Update the coverage the new via contributes to
+            via_index.insert(pos, pos.x, pos.y, pos.x, pos.y)
+            for pad in nearby_pads(pos):
+                reach = pad_ring(pad) + pad_radius
+                if id(pad) in pad_demand and self._distance(pos, pad['pos']) < reach:
+                    pad_demand[id(pad)] -= 1
+        
+        return placed, skipped
+    
+    def _failure(self, error):
+        """Build a failed result dict"""
+        return {
+            'success': False,
+            'error': error,
+            'vias_placed': 0,
+            'vias_skipped': 0
+        }
+    
+    def _extract_snapshot(self):
+        """Read the vias, pads and tracks a plan depends on"""
+        return {
+            'vias': self._get_existing_vias(),
+            'pads': self._get_all_pads(),
+            'tracks': self._get_all_tracks()
+        }
+    
+    def _fingerprint(self, snapshot):
+        """Hash the board geometry of a snapshot"""
+        bbox = self._get_board_area()
+        parts = [(bbox.GetX(), bbox.GetY(), bbox.GetWidth(), bbox.GetHeight())]
+        
+        for item in snapshot['vias'] + snapshot['pads']:
+            parts.append((
+                item['kind'], item['pos'].x, item['pos'].y, item['size'], item['net']
+            ))
+        for item in snapshot['tracks']:
+            part = (
+                item['type'], item['start'].x, item['start'].y,
+                item['end'].x, item['end'].y, item['width'], item['net'],
+                item['selected']
+            )
+            if item['type'] == 'arc':
+                # Start and end alone miss a moved arc midpoint
+                part += (item['center'].x, item['center'].y, item['radius'])
+            parts.append(part)
+        
+        # A digest rather than hash() so distinct boards never share a key
+        return hashlib.sha256(repr(parts).encode('utf-8')).hexdigest()
+    
+    def _plan_key(self, jobs):
+        """Hashable key of the jobs and generator settings"""
+        return (
+            tuple(tuple(sorted(job.items())) for job in jobs),
+            self.min_clearance,
+            self.via_to_via_clearance,
+            self.index_cell_size
+        )
+    
+    def _build_index(self, snapshot):
+        """Load the snapshot items into a spatial index"""
+        index = SpatialIndex(pcbnew.FromMM(self.index_cell_size))
+        for kind in ('vias', 'pads', 'tracks'):
+            for item in snapshot[kind]:
+                self._index_item(index, item)
+        return index
+    
+    def _index_item(self, index, item):
+        """Insert a board item dict into the index using its bounding box"""
+        if item['kind'] == 'track':
+            half = item['width'] / 2
+            if item['type'] == 'arc':
+                # Conservative box around the full circle
+                reach = item['radius'] + half
+                cx, cy = item['center'].x, item['center'].y
+                index.insert(item, cx - reach, cy - reach, cx + reach, cy + reach)
+            else:
+                start, end = item['start'], item['end']
+                index.insert(
+                    item,
+                    min(start.x, end.x) - half, min(start.y, end.y) - half,
+                    max(start.x, end.x) + half, max(start.y, end.y) + half
+                )
+        else:
+            # Grow planned vias by their clearance so queries reach them
+            half = item['size'] / 2 + max(
+                item.get('clearance', 0), item.get('via_clearance', 0)
+            )
+            x, y = item['pos'].x, item['pos'].y
+            index.insert(item, x - half, y - half, x + half, y + half)
     
     def _find_net(self, net_name):
         """Find net by name"""
@@ -143,6 +614,7 @@ class ViaGridGenerator:
         for track in self.board.GetTracks():
             if track.GetClass() == 'PCB_VIA':
                 vias.append({
+                    'kind': 'via',
                     'pos': track.GetPosition(),
                     'size': track.GetWidth(),
                     'net': track.GetNetCode()
@@ -155,6 +627,7 @@ class ViaGridGenerator:
         for footprint in self.board.GetFootprints():
             for pad in footprint.Pads():
                 pads.append({
+                    'kind': 'pad',
                     'pos': pad.GetPosition(),
                     'size': max(pad.GetSize()[0], pad.GetSize()[1]),
                     'net': pad.GetNetCode()
@@ -168,39 +641,29 @@ class ViaGridGenerator:
             track_class = track.GetClass()
             if track_class == 'PCB_TRACK':
                 tracks.append({
+                    'kind': 'track',
                     'type': 'segment',
                     'start': track.GetStart(),
                     'end': track.GetEnd(),
                     'width': track.GetWidth(),
-                    'net': track.GetNetCode()
+                    'net': track.GetNetCode(),
+                    'selected': track.IsSelected()
                 })
             elif track_class == 'PCB_ARC':
                 # For arcs, we need to check differently
                 tracks.append({
+                    'kind': 'track',
                     'type': 'arc',
                     'center': track.GetCenter(),
                     'start': track.GetStart(),
                     'end': track.GetEnd(),
                     'width': track.GetWidth(),
                     'net': track.GetNetCode(),
-                    'radius': track.GetRadius()
+                    'radius': track.GetRadius(),
+                    'selected': track.IsSelected()
                 })
         return tracks
     
-    def _get_all_zones(self):
-        """Get all copper zones"""
-        zones = []
-        for zone in self.board.Zones():
-            if zone.GetIsRuleArea():
-                # Skip rule areas (keepouts)
-                continue
-            zones.append({
-                'net': zone.GetNetCode(),
-                'layer': zone.GetLayer(),
-                'zone': zone
-            })
-        return zones
-    
     def _generate_grid_positions(self, area, spacing):
         """Generate grid positions within the given area"""
         positions = []
@@ -234,6 +697,274 @@ class ViaGridGenerator:
         
         return positions
     
+    def _generate_fence_positions(self, offset, pitch):
+        """Generate fence positions along both sides of the selected tracks"""
+        primitives = []
+        for track in self.board.GetTracks():
+            if not track.IsSelected():
+                continue
+            primitive = self._fence_primitive(track)
+            if primitive:
+                primitives.append(primitive)
+        
+        positions = []
+        for chain in self._build_track_chains(primitives):
+            points, closed = self._flatten_chain(chain)
+            for side in (1, -1):
+                path = self._offset_path(points, closed, side * offset)
+                for x, y in self._sample_path(path, pitch):
+                    pos = pcbnew.VECTOR2I(int(round(x)), int(round(y)))
+                    if self._is_inside_board(pos):
+                        positions.append(pos)
+        
+        return positions
+    
+    def _fence_primitive(self, track):
+        """Convert a selected track or arc into a path primitive"""
+        track_class = track.GetClass()
+        start = (track.GetStart().x, track.GetStart().y)
+        end = (track.GetEnd().x, track.GetEnd().y)
+        
+        if track_class == 'PCB_TRACK':
+            return {'type': 'segment', 'start': start, 'end': end}
+        
+        if track_class == 'PCB_ARC':
+            center = (track.GetCenter().x, track.GetCenter().y)
+            mid = track.GetMid()
+            
+            # Derive the signed sweep from the start, mid and end angles
+            start_angle = math.atan2(start[1] - center[1], start[0] - center[0])
+            mid_angle = math.atan2(mid.y - center[1], mid.x - center[0])
+            end_angle = math.atan2(end[1] - center[1], end[0] - center[0])
+            sweep = (end_angle - start_angle) % (2 * math.pi)
+            if (mid_angle - start_angle) % (2 * math.pi) > sweep:
+                sweep -= 2 * math.pi
+            
+            return {
+                'type': 'arc',
+                'start': start,
+                'end': end,
+                'center': center,
+                'radius': float(track.GetRadius()),
+                'angle': start_angle,
+                'sweep': sweep
+            }
+        
+        return None
+    
+    def _reverse_primitive(self, primitive):
+        """Return the primitive traversed in the opposite direction"""
+        reverse = dict(primitive)
+        reverse['start'] = primitive['end']
+        reverse['end'] = primitive['start']
+        if primitive['type'] == 'arc':
+            reverse['angle'] = primitive['angle'] + primitive['sweep']
+            reverse['sweep'] = -primitive['sweep']
+        return reverse
+    
+    def _build_track_chains(self, primitives):
+        """Join primitives sharing endpoints into ordered chains"""
+        nodes = {}
+        for idx, primitive in enumerate(primitives):
+            nodes.setdefault(primitive['start'], []).append(idx)
+            nodes.setdefault(primitive['end'], []).append(idx)
+        
+        used = set()
+        chains = []
+        
+        for idx, primitive in enumerate(primitives):
+            if idx in used:
+                continue
+            used.add(idx)
+            chain = [primitive]
+            
+            # Extend forward from the chain end
+            while True:
+                following = self._next_primitive(chain[-1]['end'], nodes, used, primitives)
+                if following is None:
+                    break
+                chain.append(following)
+            
+            # Extend backward from the chain start
+            while True:
+                preceding = self._next_primitive(chain[0]['start'], nodes, used, primitives)
+                if preceding is None:
+                    break
+                chain.insert(0, self._reverse_primitive(preceding))
+            
+            chains.append(chain)
+        
+        return chains
+    
+    def _next_primitive(self, point, nodes, used, primitives):
+        """Take the unused primitive continuing a chain at point, oriented away from it"""
+        connected = nodes.get(point, [])
+        if len(connected) != 2:
+            # Chain ends or branches here
+            return None
+        
+        for idx in connected:
+            if idx not in used:
+                used.add(idx)
+                primitive = primitives[idx]
+                if primitive['start'] != point:
+                    primitive = self._reverse_primitive(primitive)
+                return primitive
+        
+        return None
+    
+    def _flatten_chain(self, chain):
+        """
+        Turn a chain into a centerline polyline
+        
+        Arcs are split into chords deviating at most arc_tolerance from the
+        true arc. Returns (points, closed).
+        """
+        tolerance = pcbnew.FromMM(self.arc_tolerance)
+        points = [chain[0]['start']]
+        
+        for primitive in chain:
+            if primitive['type'] == 'arc':
+                radius = primitive['radius']
+                sweep = primitive['sweep']
+                if radius > tolerance:
+                    step = 2 * math.acos(1 - tolerance / radius)
+                    count = max(1, int(math.ceil(abs(sweep) / step)))
+                else:
+                    count = 1
+                cx, cy = primitive['center']
+                for i in range(1, count):
+                    angle = primitive['angle'] + sweep * i / count
+                    points.append((
+                        cx + radius * math.cos(angle),
+                        cy + radius * math.sin(angle)
+                    ))
+            points.append(primitive['end'])
+        
+        # Drop zero-length pieces
+        cleaned = [points[0]]
+        for point in points[1:]:
+            if point != cleaned[-1]:
+                cleaned.append(point)
+        
+        closed = len(cleaned) > 2 and cleaned[0] == cleaned[-1]
+        if closed:
+            cleaned.pop()
+        return cleaned, closed
+    
+    def _offset_path(self, points, closed, offset):
+        """
+        Offset a polyline to its left by offset (right when negative)
+        
+        Outer corners get a round join around the centerline vertex and
+        inner corners are trimmed to the intersection of the neighbouring
+        offset edges. Edges that vanish in the trim are dropped.
+        """
+        count = len(points) if closed else len(points) - 1
+        if count < 1:
+            return []
+        
+        # Unit direction and left normal of every centerline edge
+        edges = []
+        for i in range(count):
+            (px, py), (qx, qy) = points[i], points[(i + 1) % len(points)]
+            length = math.hypot(qx - px, qy - py)
+            ux, uy = (qx - px) / length, (qy - py) / length
+            nx, ny = -uy, ux
+            edges.append({
+                'start': (px + nx * offset, py + ny * offset),
+                'end': (qx + nx * offset, qy + ny * offset),
+                'vertex': (qx, qy),
+                'dir': (ux, uy),
+                'normal': (nx, ny)
+            })
+        
+        def turn(first, second):
+            # Signed turn angle from one edge direction to the next
+            (ax, ay), (bx, by) = first['dir'], second['dir']
+            return math.atan2(ax * by - ay * bx, ax * bx + ay * by)
+        
+        def is_inner(first, second):
+            angle = turn(first, second)
+            return abs(angle) > 1e-9 and angle * offset > 0 and abs(angle) < math.pi - 1e-9
+        
+        def intersect(first, second):
+            (ax, ay), (ux, uy) = first['start'], first['dir']
+            (bx, by), (vx, vy) = second['start'], second['dir']
+            t = ((bx - ax) * vy - (by - ay) * vx) / (ux * vy - uy * vx)
+            return (ax + ux * t, ay + uy * t)
+        
+        # Trim inner corners, dropping edges that turn around in the trim
+        kept = list(range(count))
+        while True:
+            trimmed = {}
+            for pos, i in enumerate(kept):
+                edge = edges[i]
+                start, end = edge['start'], edge['end']
+                if closed or pos > 0:
+                    prev = edges[kept[pos - 1]]
+                    if is_inner(prev, edge):
+                        start = intersect(prev, edge)
+                if closed or pos < len(kept) - 1:
+                    following = edges[kept[(pos + 1) % len(kept)]]
+                    if is_inner(edge, following):
+                        end = intersect(edge, following)
+                trimmed[i] = (start, end)
+            
+            collapsed = [
+                i for i in kept
+                if (trimmed[i][1][0] - trimmed[i][0][0]) * edges[i]['dir'][0] +
+                   (trimmed[i][1][1] - trimmed[i][0][1]) * edges[i]['dir'][1] <= 0
+            ]
+            if len(collapsed) == len(kept):
+                # The offset is wider than this side can hold
+                return []
+            if not collapsed:
+                break
+            kept = [i for i in kept if i not in collapsed]
+        
+        # Walk the kept edges, adding round joins at outer corners
+        path = []
+        for pos, i in enumerate(kept):
+            start, end = trimmed[i]
+            if not path or path[-1] != start:
+                path.append(start)
+            path.append(end)
+            
+            if not closed and pos == len(kept) - 1:
+                break
+            following = edges[kept[(pos + 1) % len(kept)]]
+            if not is_inner(edges[i], following):
+                angle = turn(edges[i], following)
+                steps = int(math.ceil(abs(angle) / (math.pi / 32)))
+                vx, vy = edges[i]['vertex']
+                nx, ny = edges[i]['normal']
+                base = math.atan2(ny * offset, nx * offset)
+                for step in range(1, steps):
+                    a = base + angle * step / steps
+                    path.append((vx + abs(offset) * math.cos(a), vy + abs(offset) * math.sin(a)))
+        
+        if closed and path:
+            path.append(path[0])
+        return path
+    
+    def _sample_path(self, path, pitch):
+        """Sample points every pitch along a polyline by its own length"""
+        points = []
+        next_at = 0.0
+        
+        for (sx, sy), (ex, ey) in zip(path, path[1:]):
+            length = math.hypot(ex - sx, ey - sy)
+            if length == 0:
+                continue
+            while next_at <= length:
+                t = next_at / length
+                points.append((sx + (ex - sx) * t, sy + (ey - sy) * t))
+                next_at += pitch
+            next_at -= length
+        
+        return points
+    
     def _is_inside_board(self, pos):
         """Check if position is inside board outline"""
         # Simple implementation - just check bounding box
@@ -241,47 +972,49 @@ class ViaGridGenerator:
         bbox = self.board.GetBoardEdgesBoundingBox()
         return bbox.Contains(pos)
     
-    def _check_clearances(self, pos, via_size, net_code, 
-                         vias, pads, tracks, zones):
+    def _check_clearances(self, pos, via_size, net_code, index,
+                         min_clear, via_clear):
         """Check if via placement would violate clearances"""
         via_radius = via_size / 2
-        min_clear = pcbnew.FromMM(self.min_clearance)
-        via_clear = pcbnew.FromMM(self.via_to_via_clearance)
-        
-        # Check against vias
-        for via in vias:
-            dist = self._distance(pos, via['pos'])
-            if via['net'] == net_code:
-                # Same net - use smaller clearance
-                if dist < (via_radius + via['size']/2 + via_clear):
-                    return False
-            else:
-                # Different net
-                if dist < (via_radius + via['size']/2 + min_clear):
-                    return False
+        reach = via_radius + max(min_clear, via_clear)
         
-        # Check against pads
-        for pad in pads:
-            if pad['net'] != net_code:
-                dist = self._distance(pos, pad['pos'])
-                if dist < (via_radius + pad['size']/2 + min_clear):
+        for item in index.query(pos.x, pos.y, reach):
+            kind = item['kind']
+            
+            if kind == 'via':
+                # Vias planned by earlier jobs keep their own clearances
+                dist = self._distance(pos, item['pos'])
+                if item['net'] == net_code:
+                    # Same net - use smaller clearance
+                    clear = max(via_clear, item.get('via_clearance', 0))
+                else:
+                    # Different net
+                    clear = max(min_clear, item.get('clearance', 0))
+                if dist < (via_radius + item['size']/2 + clear):
                     return False
-        
-        # Check against tracks
-        for track in tracks:
-            if track['net'] != net_code:
-                if track['type'] == 'segment':
+            
+            elif item['net'] == net_code:
+                # Same-net pads and tracks never block a via
+                continue
+            
+            elif kind == 'pad':
+                dist = self._distance(pos, item['pos'])
+                if dist < (via_radius + item['size']/2 + min_clear):
+                    return False
+            
+            elif kind == 'track':
+                if item['type'] == 'segment':
                     dist = self._distance_to_segment(
-                        pos, track['start'], track['end']
+                        pos, item['start'], item['end']
                     )
-                elif track['type'] == 'arc':
+                elif item['type'] == 'arc':
                     dist = self._distance_to_arc(
-                        pos, track['center'], track['radius'], track['start'], track['end']
+                        pos, item['center'], item['radius'], item['start'], item['end']
                     )
                 else:
                     continue
                     
-                if dist < (via_radius + track['width']/2 + min_clear):
+                if dist < (via_radius + item['width']/2 + min_clear):
                     return False
         
         return True